@@ -1,14 +1,19 @@
 from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, UploadFile, File, Form
 from typing import Annotated
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy.orm import Session
 from auth.db import engine, session
 import auth.authentication as auth
 from starlette import status
 from auth.authentication import get_current_user
-from models.models import Base, MLModel, CreateListModelRequest, Job, STTResult, SAResult
+from models.models import Base, MLModel, CreateListModelRequest, Job, STTResult, SAResult, upgrade_schema
 from datetime import datetime, timezone
 import yaml
+import json
 from importlib import import_module
+from scripts.audio_preprocessing import AudioPreprocessor
+from scripts.retention import RetentionManager
+from scripts.workers import WorkerPool
 
 tags_metadata = [
     {
@@ -29,6 +34,7 @@ app = FastAPI(root_path="/api/v1", openapi_tags=tags_metadata)
 app.include_router(auth.router)
 
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 def get_db():
     db = session()
@@ -42,38 +48,95 @@ def load_model_config(config_path='config/config_model.yaml'):
         config = yaml.safe_load(file)
     return config
 
+def get_model_config(config, model_name: str):
+    for model_config in config['models']:
+        if model_config['name'] == model_name:
+            return model_config
+
+def build_model_function(model_config, **params):
+    module_name = model_config['module']
+    class_name, function_name = model_config['function'].rsplit('.', 1)
+    module = import_module(f'scripts.{module_name}')
+    model_class = getattr(module, class_name)
+    model_params = {key: value for key, value in params.items() if key in model_config['params']}  
+    model_instance = model_class(**model_params)
+    function = getattr(model_instance, function_name)
+    return function
+
 def get_model_function(config, db: Session, model_id: int, **params):
     model = db.query(MLModel).filter(MLModel.id == model_id).first()
     if not model:
         raise ValueError(f"No model found for model_id {model_id}")
     
-    for model_config in config['models']:
-        if model_config['name'] == model.ml_model_name:
-            module_name = model_config['module']
-            class_name, function_name = model_config['function'].rsplit('.', 1)
-            module = import_module(f'scripts.{module_name}')
-            model_class = getattr(module, class_name)
-            model_params = {key: value for key, value in params.items() if key in model_config['params']}  
-            model_instance = model_class(**model_params)
-            function = getattr(model_instance, function_name)
-            return function
+    model_config = get_model_config(config, model.ml_model_name)
+    if model_config:
+        return build_model_function(model_config, **params)
 
 def get_desc_result_model_id(config, db: Session, model_id: int):
     model = db.query(MLModel).filter(MLModel.id == model_id).first()
     if not model:
         raise ValueError(f"No model found for model_id {model_id}")
     
-    for model_config in config['models']:
-        if model_config['name'] == model.ml_model_name:
-            table_model = globals()[model_config['table_model']]
-            output_columns = model_config['output_columns']
-            return table_model, output_columns
-        else:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="models has not registered to the system yet")
+    model_config = get_model_config(config, model.ml_model_name)
+    if not model_config:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="models has not registered to the system yet")
+    table_model = globals()[model_config['table_model']]
+    output_columns = model_config['output_columns']
+    return table_model, output_columns
+
+def build_pipeline_stages(model_configs):
+    """
+    Group the requested models into stages of a dependency graph.
+
+    Every model of a stage only depends on models of earlier stages, so the models
+    of one stage can run concurrently. Dependencies come from the optional
+    `depends_on` list of each model config.
+
+    Args:
+        model_configs (list): Configs of the requested models.
+
+    Returns:
+        list: Stages, each a list of model names.
+
+    Raises:
+        ValueError: If a dependency was not requested or the graph has a cycle.
+    """
+    pending = {model_config['name']: set(model_config.get('depends_on', [])) for model_config in model_configs}
+    for name, depends_on in pending.items():
+        missing = depends_on - pending.keys()
+        if missing:
+            raise ValueError(f"{name} depends on {', '.join(sorted(missing))}, which is not in the pipeline")
+
+    stages = []
+    done = set()
+    while pending:
+        stage = [name for name, depends_on in pending.items() if depends_on <= done]
+        if not stage:
+            raise ValueError(f"Pipeline has a dependency cycle between {', '.join(sorted(pending))}")
+        stages.append(stage)
+        done.update(stage)
+        for name in stage:
+            del pending[name]
+    return stages
 
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 model_config = load_model_config()
+retention_manager = RetentionManager.from_config()
+worker_pool = WorkerPool.from_config()
+worker_pool.configure()
+
+@app.on_event("startup")
+def start_retention():
+    retention_manager.start_background()
+
+@app.on_event("shutdown")
+def stop_retention():
+    retention_manager.stop()
+
+@app.on_event("shutdown")
+def stop_workers():
+    worker_pool.close()
 
 @app.get("/user", status_code=status.HTTP_200_OK, tags=["users"])
 async def check_user(user: user_dependency):
@@ -81,25 +144,94 @@ async def check_user(user: user_dependency):
         raise HTTPException(status_code=401, detail='Authentication Failed')
     return {"User": user}
 
+def finish_job(db: Session, job_id: int, message: str):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    job.complete = True
+    job.message = message
+    job.updated_at = datetime.now(tz=timezone.utc)
+    db.commit()
+
+def call_model(model_config, job_id: int, model_id: int, correlation_id: str, **params):
+    model_function = build_model_function(model_config, **params)
+    model_function(job_id=job_id, model_id=model_id, correlation_id=correlation_id)
+
+def run_model(db: Session, job_id: int, model_id: int, correlation_id: str, **params):
+    model_function = get_model_function(model_config, db, model_id, **params)
+    if not model_function:
+        raise ValueError(f"No model function found for model_id {model_id}")
+    
+    model_function(job_id=job_id, model_id=model_id, correlation_id=correlation_id)
+
 def process_audio(db: Session, job_id: str, model_id: int, correlation_id: str, **params):
     try:
-        model_function = get_model_function(model_config, db, model_id, **params)
-        if not model_function:
-            raise ValueError(f"No model function found for model_id {model_id}")
-        
-        model_function(job_id=job_id, model_id=model_id, correlation_id=correlation_id)
-
-        job = db.query(Job).filter(Job.id == job_id).first()
-        job.complete = True
-        job.message = "successful"
-        job.updated_at = datetime.now(tz=timezone.utc)
-        db.commit()
+        # The caller waits for the slot, so the session is never used by two threads at once.
+        worker_pool.run(run_model, db, job_id, model_id, correlation_id, **params)
+
+        finish_job(db, job_id, "successful")
     except Exception as e:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        job.complete = True
-        job.message = f"failed: {str(e)}"
-        job.updated_at = datetime.now(tz=timezone.utc)
-        db.commit()
+        finish_job(db, job_id, f"failed: {str(e)}")
+
+def run_pipeline_model(model_config, job_id: int, model_id: int, correlation_id: str, **params):
+    worker_pool.run(call_model, model_config, job_id, model_id, correlation_id, **params)
+
+def process_pipeline(db: Session, parent_id: int, stages: list, children: dict, correlation_id: str, audio_contents: bytes):
+    """
+    Run the models of a pipeline job stage by stage on one decoded audio.
+
+    The upload is decoded once and shared by every model. Models of the same stage
+    run concurrently; a model whose dependency failed is skipped. Job rows are only
+    updated from this thread, since the session is not thread safe.
+
+    Args:
+        db (Session): Database session.
+        parent_id (int): Id of the pipeline job.
+        stages (list): Stages returned by `build_pipeline_stages`.
+        children (dict): Model name to (model config, child job id, model id).
+        correlation_id (str): Correlation id of the request.
+        audio_contents (bytes): Raw contents of the uploaded file.
+    """
+    try:
+        decoded = AudioPreprocessor.decode(audio_contents)
+    except Exception as e:
+        for _, job_id, _ in children.values():
+            finish_job(db, job_id, f"failed: {str(e)}")
+        finish_job(db, parent_id, f"failed: {str(e)}")
+        return
+
+    failed = set()
+    for stage in stages:
+        runnable = []
+        for name in stage:
+            child_config, job_id, _ = children[name]
+            blocked = failed.intersection(child_config.get('depends_on', []))
+            if blocked:
+                failed.add(name)
+                finish_job(db, job_id, f"failed: skipped because {', '.join(sorted(blocked))} failed")
+            else:
+                runnable.append(name)
+        if not runnable:
+            continue
+
+        with ThreadPoolExecutor(max_workers=len(runnable)) as executor:
+            futures = {}
+            for name in runnable:
+                child_config, job_id, model_id = children[name]
+                future = executor.submit(run_pipeline_model, child_config, job_id, model_id, correlation_id,
+                                         audio_contents=audio_contents, decoded=decoded)
+                futures[future] = name
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                    finish_job(db, children[name][1], "successful")
+                except Exception as e:
+                    failed.add(name)
+                    finish_job(db, children[name][1], f"failed: {str(e)}")
+
+    if failed:
+        finish_job(db, parent_id, f"failed: {', '.join(sorted(failed))}")
+    else:
+        finish_job(db, parent_id, "successful")
 
 @app.post("/models/regis_model", status_code=status.HTTP_201_CREATED, tags=["models"])
 async def create_model_name(db: db_dependency, user: user_dependency,
@@ -150,6 +282,123 @@ async def create_inference(model_id: int, background_tasks: BackgroundTasks,
     
     return {"message": "created", "job_id": job.id}
 
+@app.post("/models/pipeline", status_code=status.HTTP_201_CREATED, tags=["models"])
+async def create_pipeline(background_tasks: BackgroundTasks, db: db_dependency, user: user_dependency,
+                          data: UploadFile = File(...), model_names: str = Form(...),
+                          explaining: str = Form(...), correlation_id: str = Form(...)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed')
+    
+    if explaining.lower() != "true":
+        raise HTTPException(status_code=400, detail="Invalid value for 'explaining'")
+    
+    if not (data.filename.endswith(".mp3") or data.filename.endswith(".wav")):
+        raise HTTPException(status_code=400, detail="Invalid file format. Only mp3 and wav files are supported.")
+
+    try:
+        names = json.loads(model_names) if model_names.strip().startswith('[') else model_names.split(',')
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid value for 'model_names'")
+    names = list(dict.fromkeys(str(name).strip() for name in names if str(name).strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="Invalid value for 'model_names'")
+
+    model_configs = []
+    for name in names:
+        child_config = get_model_config(model_config, name)
+        if not child_config:
+            raise HTTPException(status_code=400, detail=f"Model '{name}' can not be used in a pipeline")
+        model_configs.append(child_config)
+    models = {model.ml_model_name: model for model in db.query(MLModel).filter(MLModel.ml_model_name.in_(names)).all()}
+    for name in names:
+        if name not in models:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Model '{name}' has not registered to the system yet")
+    try:
+        stages = build_pipeline_stages(model_configs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    file_contents = data.file.read()
+
+    parent = Job(
+        model_id=None,
+        correlation_id=correlation_id,
+        transaction="pipeline",
+        complete=False,
+        message="on progress",
+        file_name=data.filename
+    )
+    db.add(parent)
+    db.commit()
+    db.refresh(parent)
+
+    children = {}
+    for child_config in model_configs:
+        name = child_config['name']
+        job = Job(
+            model_id=models[name].id,
+            parent_id=parent.id,
+            correlation_id=correlation_id,
+            transaction="reply",
+            complete=False,
+            message="on progress",
+            file_name=data.filename
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        children[name] = (child_config, job.id, models[name].id)
+
+    background_tasks.add_task(process_pipeline, db, parent.id, stages, children, correlation_id, file_contents)
+
+    return {
+        "message": "created",
+        "job_id": parent.id,
+        "children": [{"ml_model_name": name, "model_id": model_id, "job_id": job_id}
+                     for name, (_, job_id, model_id) in children.items()],
+    }
+
+@app.get("/models/pipeline/{job_id}", status_code=status.HTTP_200_OK, tags=["models"])
+async def get_pipeline(job_id: int, db: db_dependency, user: user_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Authentication Failed')
+
+    parent = db.query(Job).filter(Job.id == job_id, Job.transaction == "pipeline").first()
+    if not parent:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No pipeline found for the given job_id')
+
+    children = []
+    for job in db.query(Job).filter(Job.parent_id == parent.id).order_by(Job.id).all():
+        child_config = get_model_config(model_config, job.model.ml_model_name)
+        results = []
+        if child_config:
+            table_model = globals()[child_config['table_model']]
+            results = db.query(table_model).filter(table_model.job_id == job.id, table_model.model_id == job.model_id).all()
+        children.append({
+            "id": job.id,
+            "model_id": job.model_id,
+            "ml_model_name": job.model.ml_model_name,
+            "updated_at": job.updated_at.isoformat(),
+            "progress": {
+                "complete": job.complete,
+                "message": job.message,
+            },
+            "results": [{col: getattr(result, col) for col in child_config['output_columns']} for result in results],
+        })
+
+    return {
+        "id": parent.id,
+        "transaction": parent.transaction,
+        "updated_at": parent.updated_at.isoformat(),
+        "correlation_id": parent.correlation_id,
+        "progress": {
+            "complete": parent.complete,
+            "message": parent.message,
+        },
+        "file_name": parent.file_name,
+        "children": children,
+    }
+
 @app.get("/models/{model_id}/responses", status_code=status.HTTP_200_OK, tags=["models"])
 async def check_inference_status(model_id: int, type: str, correlation_id: str, db: db_dependency, user: user_dependency):
     if user is None:
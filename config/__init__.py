@@ -0,0 +1,18 @@
+import yaml
+
+CONFIG_PATH = 'config/config_model.yaml'
+
+def load_config_section(section, config_path=CONFIG_PATH):
+    """
+    Load a single top-level section of the model config file.
+
+    Args:
+        section (str): Name of the section, e.g. "preprocessing".
+        config_path (str): Path to the yaml config file.
+
+    Returns:
+        dict: The section contents, or an empty dict when it is not defined.
+    """
+    with open(config_path, 'r') as file:
+        config = yaml.safe_load(file)
+    return config.get(section) or {}
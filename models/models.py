@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, PrimaryKeyConstraint, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, PrimaryKeyConstraint, JSON, inspect, text
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.schema import Sequence
 from pydantic import BaseModel
@@ -35,12 +35,13 @@ class Job(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     model_id = Column(Integer, ForeignKey('ml_models.id'))
+    parent_id = Column(Integer, ForeignKey('ml_models_inference.id'), nullable=True, index=True)
     file_name = Column(String)
     correlation_id = Column(String, index=True)
     transaction = Column(String)
     complete = Column(Boolean, default=False)
     message = Column(String, nullable=True)
-    updated_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, index=True)
 
     model = relationship('MLModel')
 
@@ -55,10 +56,11 @@ class STTResult(Base):
     correlation_id = Column(String, index=True)
     transcription = Column(JSON)
     audio_duration = Column(Float)
+    silence_removed = Column(Float)
     start_time = Column(DateTime)
     finish_time = Column(DateTime)
     stt_duration = Column(Integer)
-    inserted_at = Column(DateTime)
+    inserted_at = Column(DateTime, index=True)
 
     model = relationship('MLModel')
     job = relationship('Job')
@@ -76,10 +78,41 @@ class SAResult(Base):
     emotion_result = Column(String)
     confidence_value = Column(Float)
     audio_duration = Column(Float)
+    silence_removed = Column(Float)
+    audio_hash = Column(String(64), index=True)
     start_time = Column(DateTime)
     finish_time = Column(DateTime)
     sa_duration = Column(Integer)
-    inserted_at = Column(DateTime)
+    inserted_at = Column(DateTime, index=True)
 
     model = relationship('MLModel')
-    job = relationship('Job')
\ No newline at end of file
+    job = relationship('Job')
+
+
+def upgrade_schema(engine):
+    """
+    Bring tables created by an older release up to date with the models above.
+
+    `Base.metadata.create_all` only creates missing tables, so columns and indexes
+    added to existing tables are created here. Every step checks what already
+    exists, so running it on each startup is safe.
+
+    Args:
+        engine: SQLAlchemy engine of the database to upgrade.
+    """
+    inspector = inspect(engine)
+    if_not_exists = 'IF NOT EXISTS ' if engine.dialect.name == 'postgresql' else ''
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {if_not_exists}{column.name} {column.type.compile(engine.dialect)}"
+                for foreign_key in column.foreign_keys:
+                    ddl += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
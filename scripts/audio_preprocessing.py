@@ -0,0 +1,237 @@
+import sys
+import time
+import numpy as np
+import librosa
+from io import BytesIO
+
+from config import CONFIG_PATH, load_config_section
+
+
+class PreprocessedAudio:
+    """
+    Audio ready to be fed to a model, together with the bookkeeping of the preprocessing stage.
+
+    Attributes:
+        data (np.ndarray): Mono float32 waveform at the model's native sample rate.
+        samplerate (int): Sample rate of `data`.
+        original_duration (float): Duration of the uploaded audio in seconds.
+        silence_removed (float): Seconds of silence trimmed away before inference.
+    """
+
+    def __init__(self, data, samplerate, original_duration, silence_removed):
+        self.data = data
+        self.samplerate = samplerate
+        self.original_duration = original_duration
+        self.silence_removed = silence_removed
+
+
+class AudioPreprocessor:
+    """
+    Vectorized preprocessing that runs on the decoded audio before inference.
+
+    The stage downmixes to mono, resamples to the model's native rate, trims long
+    silent stretches with a frame-energy voice activity detector and normalizes
+    the loudness of what is left.
+
+    Methods:
+        from_config(target_sr): Builds a preprocessor from the `preprocessing` config section.
+        decode(audio_contents): Decodes uploaded bytes at their native rate and channel layout.
+        process(audio_contents): Decodes and preprocesses uploaded bytes.
+        process_decoded(data, samplerate): Preprocesses an already decoded waveform.
+    """
+
+    def __init__(self, target_sr, trim_silence=True, top_db=40.0, frame_duration=0.025,
+                 hop_duration=0.010, min_silence_duration=0.5, keep_silence=0.15,
+                 normalize=True, target_dbfs=-20.0):
+        self.target_sr = target_sr
+        self.trim_silence = trim_silence
+        self.top_db = top_db
+        self.frame_duration = frame_duration
+        self.hop_duration = hop_duration
+        self.min_silence_duration = min_silence_duration
+        self.keep_silence = keep_silence
+        self.normalize = normalize
+        self.target_dbfs = target_dbfs
+
+    @classmethod
+    def from_config(cls, target_sr, config_path=CONFIG_PATH):
+        """
+        Build a preprocessor from the `preprocessing` section of the model config.
+
+        Args:
+            target_sr (int): Native sample rate of the model that consumes the audio.
+            config_path (str): Path to the yaml config file.
+
+        Returns:
+            AudioPreprocessor: The configured preprocessor.
+        """
+        params = load_config_section('preprocessing', config_path)
+        return cls(target_sr=target_sr, **params)
+
+    @staticmethod
+    def decode(audio_contents):
+        """
+        Decode uploaded audio bytes without resampling or downmixing.
+
+        Args:
+            audio_contents (bytes): Raw contents of the uploaded mp3/wav file.
+
+        Returns:
+            tuple: The waveform, shaped (samples,) or (channels, samples), and its sample rate.
+        """
+        data, samplerate = librosa.load(BytesIO(audio_contents), sr=None, mono=False)
+        return data, samplerate
+
+    def process(self, audio_contents):
+        """
+        Decode and preprocess uploaded audio bytes.
+
+        Args:
+            audio_contents (bytes): Raw contents of the uploaded mp3/wav file.
+
+        Returns:
+            PreprocessedAudio: The audio ready for inference.
+        """
+        data, samplerate = self.decode(audio_contents)
+        return self.process_decoded(data, samplerate)
+
+    def process_decoded(self, data, samplerate):
+        """
+        Preprocess an already decoded waveform.
+
+        Args:
+            data (np.ndarray): Waveform shaped (samples,) or (channels, samples).
+            samplerate (int): Sample rate of `data`.
+
+        Returns:
+            PreprocessedAudio: The audio ready for inference.
+        """
+        data = self.downmix(data)
+        original_duration = len(data) / samplerate
+        data = self.resample(data, samplerate)
+
+        removed = 0
+        if self.trim_silence:
+            data, removed = self.trim(data)
+        if self.normalize:
+            data = self.normalize_loudness(data)
+
+        return PreprocessedAudio(
+            data=data.astype(np.float32, copy=False),
+            samplerate=self.target_sr,
+            original_duration=original_duration,
+            silence_removed=round(removed / self.target_sr, 2),
+        )
+
+    def downmix(self, data):
+        """
+        Average all channels into a single mono channel.
+
+        Args:
+            data (np.ndarray): Waveform shaped (samples,) or (channels, samples).
+
+        Returns:
+            np.ndarray: Mono waveform.
+        """
+        if data.ndim > 1:
+            data = np.mean(data, axis=0)
+        return data
+
+    def resample(self, data, samplerate):
+        """
+        Resample a mono waveform to the model's native sample rate.
+
+        Args:
+            data (np.ndarray): Mono waveform.
+            samplerate (int): Sample rate of `data`.
+
+        Returns:
+            np.ndarray: Waveform at `target_sr`.
+        """
+        if samplerate == self.target_sr:
+            return data
+        return librosa.resample(data, orig_sr=samplerate, target_sr=self.target_sr)
+
+    def trim(self, data):
+        """
+        Remove silent stretches longer than `min_silence_duration`.
+
+        Frame energies come from a cumulative sum of squares, so the detector is a
+        handful of array operations regardless of the audio length. Frames quieter
+        than `top_db` below the loudest frame are silence; short pauses are kept and
+        every voiced region is padded by `keep_silence` seconds on both sides.
+
+        Args:
+            data (np.ndarray): Mono waveform at `target_sr`.
+
+        Returns:
+            tuple: The trimmed waveform and the number of samples removed.
+        """
+        frame_length = max(1, int(round(self.frame_duration * self.target_sr)))
+        hop_length = max(1, int(round(self.hop_duration * self.target_sr)))
+        if len(data) < frame_length:
+            return data, 0
+
+        squares = np.concatenate(([0.0], np.cumsum(np.square(data, dtype=np.float64))))
+        starts = np.arange(0, len(data) - frame_length + 1, hop_length)
+        energy = (squares[starts + frame_length] - squares[starts]) / frame_length
+        energy_db = 10 * np.log10(np.maximum(energy, 1e-10))
+        voiced = energy_db > energy_db.max() - self.top_db
+
+        # Keep silent runs that are too short to be worth cutting (pauses between words).
+        edges = np.diff(np.concatenate(([1], voiced.astype(np.int8), [1])))
+        run_starts = np.flatnonzero(edges == -1)
+        run_ends = np.flatnonzero(edges == 1)
+        min_frames = int(round(self.min_silence_duration / self.hop_duration))
+        short = (run_ends - run_starts) < min_frames
+        fill = np.zeros(len(voiced) + 1, dtype=np.int64)
+        np.add.at(fill, run_starts[short], 1)
+        np.add.at(fill, run_ends[short], -1)
+        voiced |= np.cumsum(fill[:-1]) > 0
+
+        pad_frames = int(round(self.keep_silence / self.hop_duration))
+        if pad_frames > 0:
+            voiced = np.convolve(voiced, np.ones(2 * pad_frames + 1), mode='same') > 0
+
+        mask = np.repeat(voiced, hop_length)
+        if len(mask) < len(data):
+            mask = np.concatenate((mask, np.full(len(data) - len(mask), voiced[-1])))
+        mask = mask[:len(data)]
+
+        return data[mask], int(len(data) - np.count_nonzero(mask))
+
+    def normalize_loudness(self, data):
+        """
+        Scale the waveform to `target_dbfs` RMS without clipping.
+
+        Args:
+            data (np.ndarray): Mono waveform.
+
+        Returns:
+            np.ndarray: Loudness normalized waveform.
+        """
+        rms = np.sqrt(np.mean(np.square(data, dtype=np.float64))) if len(data) else 0.0
+        if rms < 1e-8:
+            return data
+        data = data * (10 ** (self.target_dbfs / 20) / rms)
+        peak = np.max(np.abs(data))
+        if peak > 0.99:
+            data = data * (0.99 / peak)
+        return data
+
+
+if __name__ == "__main__":
+    # Usage: python -m scripts.audio_preprocessing data/audio/*.wav
+    preprocessor = AudioPreprocessor.from_config(target_sr=16000)
+    for audio_path in sys.argv[1:]:
+        with open(audio_path, 'rb') as file:
+            contents = file.read()
+        # The first call pays for librosa's lazy imports, so time a second one.
+        preprocessor.process(contents)
+        start = time.perf_counter()
+        audio = preprocessor.process(contents)
+        elapsed = time.perf_counter() - start
+        kept = len(audio.data) / audio.samplerate
+        print(f"{audio_path}: original {audio.original_duration:.2f}s, "
+              f"removed {audio.silence_removed:.2f}s, kept {kept:.2f}s, "
+              f"preprocessing {elapsed * 1000:.1f}ms")
@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from config import CONFIG_PATH, load_config_section
+
+
+class FeatureStore:
+    """
+    On-disk store of pooled audio embeddings keyed by audio hash.
+
+    Embeddings live in a single float16 memory-mapped array (`embeddings.f16`)
+    that doubles in capacity when full. The index is `hashes.txt`, an append-only
+    list where line N holds the audio hash of row N, plus `meta.json` describing
+    the encoder. The store is safe to share between threads of one process.
+
+    Methods:
+        from_config(dim, model_name): Opens the store configured in the `feature_store` section.
+        hash_audio(data, samplerate): Returns the cache key of a preprocessed waveform.
+        get(audio_hash): Returns the cached embedding or None.
+        put(audio_hash, embedding): Stores an embedding.
+        items(): Returns all hashes and their embeddings.
+    """
+
+    def __init__(self, path, dim, model_name, initial_capacity=1024):
+        self.path = path
+        self.dim = dim
+        self.model_name = model_name
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.hashes_path = os.path.join(path, 'hashes.txt')
+        self.data_path = os.path.join(path, 'embeddings.f16')
+        self._lock = threading.Lock()
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r') as file:
+                meta = json.load(file)
+            if meta['dim'] != dim or meta['model_name'] != model_name:
+                raise ValueError(f"Feature store at {path} holds {meta['model_name']} embeddings "
+                                 f"of size {meta['dim']}, not {model_name} of size {dim}")
+            with open(self.hashes_path, 'r') as file:
+                self.rows = {line.strip(): row for row, line in enumerate(file)}
+            self.capacity = os.path.getsize(self.data_path) // (dim * np.dtype(np.float16).itemsize)
+            self.embeddings = np.memmap(self.data_path, dtype=np.float16, mode='r+', shape=(self.capacity, dim))
+        else:
+            self.rows = {}
+            self.capacity = initial_capacity
+            self.embeddings = np.memmap(self.data_path, dtype=np.float16, mode='w+', shape=(self.capacity, dim))
+            open(self.hashes_path, 'w').close()
+            with open(self.meta_path, 'w') as file:
+                json.dump({'dim': dim, 'model_name': model_name}, file)
+
+    @classmethod
+    def from_config(cls, dim, model_name, config_path=CONFIG_PATH):
+        """
+        Open the store configured in the `feature_store` section of the model config.
+
+        Args:
+            dim (int): Size of each embedding.
+            model_name (str): Encoder that produced the embeddings.
+            config_path (str): Path to the yaml config file.
+
+        Returns:
+            FeatureStore: The store, or None when the feature store is disabled.
+        """
+        params = load_config_section('feature_store', config_path)
+        if not params.pop('enabled', False):
+            return None
+        return cls(dim=dim, model_name=model_name, **params)
+
+    @staticmethod
+    def hash_audio(data, samplerate):
+        """
+        Compute the cache key of a preprocessed waveform.
+
+        Args:
+            data (np.ndarray): Mono waveform fed to the encoder.
+            samplerate (int): Sample rate of `data`.
+
+        Returns:
+            str: Hex sha256 digest.
+        """
+        digest = hashlib.sha256(str(samplerate).encode())
+        digest.update(np.ascontiguousarray(data, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def get(self, audio_hash):
+        """
+        Look up a cached embedding.
+
+        Args:
+            audio_hash (str): Key returned by `hash_audio`.
+
+        Returns:
+            np.ndarray: The float32 embedding, or None when it is not cached.
+        """
+        with self._lock:
+            row = self.rows.get(audio_hash)
+            if row is None:
+                return None
+            return np.asarray(self.embeddings[row], dtype=np.float32)
+
+    def put(self, audio_hash, embedding):
+        """
+        Store an embedding, overwriting any previous one for the same hash.
+
+        Args:
+            audio_hash (str): Key returned by `hash_audio`.
+            embedding (np.ndarray): Embedding of size `dim`.
+        """
+        with self._lock:
+            row = self.rows.get(audio_hash)
+            is_new = row is None
+            if is_new:
+                row = len(self.rows)
+                if row >= self.capacity:
+                    self._grow()
+            self.embeddings[row] = np.asarray(embedding, dtype=np.float16)
+            self.embeddings.flush()
+            if is_new:
+                # The row is written before its hash, so a crash never indexes an empty row.
+                with open(self.hashes_path, 'a') as file:
+                    file.write(audio_hash + '\n')
+                self.rows[audio_hash] = row
+
+    def items(self):
+        """
+        Return every cached embedding.
+
+        Returns:
+            tuple: List of hashes and a (len(hashes), dim) float16 array in the same order.
+        """
+        with self._lock:
+            hashes = list(self.rows)
+            rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(hashes))
+            return hashes, self.embeddings[rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _grow(self):
+        # Build the larger map first and swap it in with one assignment, so self.embeddings is never missing.
+        self.embeddings.flush()
+        capacity = self.capacity * 2
+        with open(self.data_path, 'r+b') as file:
+            file.truncate(capacity * self.dim * np.dtype(np.float16).itemsize)
+        self.embeddings = np.memmap(self.data_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        self.capacity = capacity
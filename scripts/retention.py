@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import importlib.util
+import pandas as pd
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, exists, func, text, DateTime, Integer
+from sqlalchemy.orm import aliased
+
+from config import CONFIG_PATH, load_config_section
+from models.models import MLModel, Job, STTResult, SAResult
+
+RESULT_TABLES = [STTResult, SAResult]
+RESULT_MODELS = {table.__name__: table for table in RESULT_TABLES}
+TABLES = {table.__tablename__: table for table in [Job] + RESULT_TABLES}
+
+
+class RetentionManager:
+    """
+    Archives and deletes expired rows of the job and result tables.
+
+    Rows older than the model's `ttl_days` are moved in batches of `batch_size`:
+    each batch is written to a compressed, time partitioned archive file under
+    `archive_dir` (mode "archive") and then deleted in the same transaction.
+    Mode "delete" skips the archive. Archived rows can be loaded back with `restore`.
+
+    Methods:
+        from_config(): Builds a manager from the `retention` and `models` config sections.
+        run(): Runs one retention pass and returns a throughput/table size report.
+        restore(table_name, start, end): Loads archived rows back into the database.
+        table_sizes(): Returns row counts (and on-disk size on PostgreSQL) per table.
+        start_background(): Runs `run` every `interval_minutes` in a daemon thread.
+    """
+
+    def __init__(self, models, enabled=False, mode='archive', archive_dir='data/archive',
+                 archive_format='jsonl', partition_by='day', batch_size=1000,
+                 interval_minutes=60, default_ttl_days=90, reports_dir='reports', engine=None):
+        if mode not in ('archive', 'delete'):
+            raise ValueError(f"Invalid retention mode '{mode}', expected 'archive' or 'delete'")
+        if archive_format not in ('jsonl', 'parquet'):
+            raise ValueError(f"Invalid archive format '{archive_format}', expected 'jsonl' or 'parquet'")
+        if archive_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError("archive_format 'parquet' requires the pyarrow package")
+        if partition_by not in ('day', 'month'):
+            raise ValueError(f"Invalid partition '{partition_by}', expected 'day' or 'month'")
+
+        self.models = models
+        self.enabled = enabled
+        self.mode = mode
+        self.archive_dir = archive_dir
+        self.archive_format = archive_format
+        self.partition_by = partition_by
+        self.batch_size = batch_size
+        self.interval_minutes = interval_minutes
+        self.default_ttl_days = default_ttl_days
+        self.reports_dir = reports_dir
+        if engine is None:
+            from auth.db import engine
+        self.engine = engine
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls, config_path=CONFIG_PATH, engine=None):
+        """
+        Build a manager from the model config file.
+
+        Args:
+            config_path (str): Path to the yaml config file.
+            engine (optional): SQLAlchemy engine to use instead of the application database.
+
+        Returns:
+            RetentionManager: The configured manager.
+        """
+        params = load_config_section('retention', config_path)
+        models = load_config_section('models', config_path)
+        return cls(models=models, engine=engine, **params)
+
+    def run(self):
+        """
+        Run one retention pass over every configured model.
+
+        Returns:
+            dict: Rows moved, bytes written and throughput per table, plus table sizes.
+        """
+        started_at = datetime.now(tz=timezone.utc)
+        stats = {name: {'rows': 0, 'bytes': 0, 'seconds': 0.0} for name in TABLES}
+
+        for model_config in self.models:
+            model_id = self._model_id(model_config['name'])
+            if model_id is None:
+                continue
+            ttl_days = model_config.get('ttl_days', self.default_ttl_days)
+            cutoff = (started_at - timedelta(days=ttl_days)).replace(tzinfo=None)
+
+            result_table = RESULT_MODELS[model_config['table_model']]
+            self._purge(result_table, result_table.inserted_at, result_table.job_id,
+                        [result_table.model_id == model_id], cutoff, stats)
+
+            # Jobs go last and only once no result row references them anymore.
+            job_filters = [Job.model_id == model_id, Job.complete.is_(True)]
+            job_filters += [~exists().where(table.job_id == Job.id) for table in RESULT_TABLES]
+            self._purge(Job, Job.updated_at, Job.id, job_filters, cutoff, stats)
+
+        # Pipeline jobs have no model of their own and go once all their children are gone.
+        child = aliased(Job)
+        cutoff = (started_at - timedelta(days=self.default_ttl_days)).replace(tzinfo=None)
+        pipeline_filters = [Job.model_id.is_(None), Job.complete.is_(True), ~exists().where(child.parent_id == Job.id)]
+        self._purge(Job, Job.updated_at, Job.id, pipeline_filters, cutoff, stats)
+
+        for table_stats in stats.values():
+            seconds = table_stats['seconds']
+            table_stats['seconds'] = round(seconds, 3)
+            table_stats['rows_per_second'] = round(table_stats['rows'] / seconds, 1) if seconds else 0.0
+
+        report = {
+            'started_at': started_at.isoformat(),
+            'mode': self.mode,
+            'tables': stats,
+            'table_sizes': self.table_sizes(),
+        }
+        self._write_report(report)
+        return report
+
+    def _model_id(self, model_name):
+        with self.engine.connect() as conn:
+            return conn.execute(select(MLModel.id).where(MLModel.ml_model_name == model_name)).scalar()
+
+    def _purge(self, table, time_column, key_column, filters, cutoff, stats):
+        """
+        Archive and delete expired rows of one table in batches.
+
+        Args:
+            table: ORM class of the table.
+            time_column: Column compared against `cutoff`.
+            key_column: Column used to delete the selected batch.
+            filters (list): Extra conditions restricting the rows, e.g. the model id.
+            cutoff (datetime): Rows with `time_column` before this moment are expired.
+            stats (dict): Per table counters updated in place.
+        """
+        table_stats = stats[table.__tablename__]
+        while True:
+            batch_start = time.perf_counter()
+            with self.engine.begin() as conn:
+                query = (select(table.__table__).where(time_column < cutoff, *filters)
+                         .order_by(time_column).limit(self.batch_size))
+                df = pd.read_sql(query, conn)
+                if df.empty:
+                    return
+                if self.mode == 'archive':
+                    table_stats['bytes'] += self._archive(table.__tablename__, time_column.key, df)
+                conn.execute(delete(table.__table__).where(key_column.in_(df[key_column.key].tolist()), *filters))
+            table_stats['rows'] += len(df)
+            table_stats['seconds'] += time.perf_counter() - batch_start
+            if len(df) < self.batch_size:
+                return
+
+    def _partition_format(self):
+        return '%Y-%m-%d' if self.partition_by == 'day' else '%Y-%m'
+
+    def _archive(self, table_name, time_column, df):
+        """
+        Write a batch to one archive file per time partition.
+
+        Args:
+            table_name (str): Name of the source table.
+            time_column (str): Column that decides the partition of each row.
+            df (pd.DataFrame): The batch to archive.
+
+        Returns:
+            int: Number of bytes written.
+        """
+        written = 0
+        partitions = pd.to_datetime(df[time_column]).dt.strftime(self._partition_format())
+        for partition, part in df.groupby(partitions):
+            directory = os.path.join(self.archive_dir, table_name, f"dt={partition}")
+            os.makedirs(directory, exist_ok=True)
+            file_name = f"part-{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+            if self.archive_format == 'parquet':
+                path = os.path.join(directory, f"{file_name}.parquet")
+                part.to_parquet(path, index=False, compression='zstd')
+            else:
+                path = os.path.join(directory, f"{file_name}.jsonl.gz")
+                part.to_json(path, orient='records', lines=True, date_format='iso', compression='gzip')
+            written += os.path.getsize(path)
+        return written
+
+    def restore(self, table_name, start=None, end=None):
+        """
+        Load archived rows back into their table.
+
+        Rows whose primary key already exists are skipped, so restoring twice is
+        harmless. Restored rows keep their original timestamps and are expired again
+        by the next `run` unless the model's TTL is raised first.
+
+        Args:
+            table_name (str): One of ml_models_inference, stt_result, sa_result.
+            start (str, optional): First partition to restore, e.g. "2024-07" or "2024-07-31".
+            end (str, optional): Last partition to restore (inclusive).
+
+        Returns:
+            int: Number of rows inserted.
+        """
+        if table_name not in TABLES:
+            raise ValueError(f"Unknown table '{table_name}'")
+        table = TABLES[table_name].__table__
+        table_dir = os.path.join(self.archive_dir, table_name)
+        if not os.path.isdir(table_dir):
+            return 0
+
+        primary_key = [column.key for column in table.primary_key.columns]
+        paths = []
+        for partition_dir in sorted(os.listdir(table_dir)):
+            partition = partition_dir.split('=', 1)[-1]
+            if start and partition < start[:len(partition)]:
+                continue
+            if end and partition > end[:len(partition)]:
+                continue
+            partition_path = os.path.join(table_dir, partition_dir)
+            paths += [os.path.join(partition_path, file_name) for file_name in sorted(os.listdir(partition_path))]
+
+        # Pipeline jobs are archived after their children but have to be inserted first,
+        # so jobs take one pass for rows without a parent and one for the rest.
+        passes = [True, False] if 'parent_id' in table.c else [None]
+        restored = 0
+        for parents in passes:
+            for path in paths:
+                df = self._read_archive(table, path)
+                if parents is not None:
+                    is_parent = df['parent_id'].isna() if 'parent_id' in df.columns else pd.Series(True, index=df.index)
+                    df = df[is_parent if parents else ~is_parent]
+                for offset in range(0, len(df), self.batch_size):
+                    restored += self._insert_missing(table, primary_key, df.iloc[offset:offset + self.batch_size])
+        return restored
+
+    def _read_archive(self, table, path):
+        if path.endswith('.parquet'):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_json(path, orient='records', lines=True, dtype=False,
+                              convert_dates=False, compression='gzip')
+        for column in table.columns:
+            if column.key not in df.columns:
+                continue
+            if isinstance(column.type, DateTime):
+                df[column.key] = pd.to_datetime(df[column.key])
+            elif isinstance(column.type, Integer):
+                df[column.key] = df[column.key].astype('Int64')
+        return df
+
+    def _insert_missing(self, table, primary_key, df):
+        with self.engine.begin() as conn:
+            existing = pd.read_sql(
+                select(*[table.c[key] for key in primary_key])
+                .where(table.c[primary_key[0]].in_([int(value) for value in df[primary_key[0]]])), conn)
+            if not existing.empty:
+                merged = df.merge(existing.astype({key: df[key].dtype for key in primary_key}),
+                                  on=primary_key, how='left', indicator=True)
+                df = df[(merged['_merge'] == 'left_only').to_numpy()]
+            if df.empty:
+                return 0
+            # Insert through the table so column types (JSON, DateTime) serialize as on any other write.
+            records = df.astype(object).where(df.notna(), None).to_dict('records')
+            conn.execute(table.insert(), records)
+        return len(df)
+
+    def table_sizes(self):
+        """
+        Report the size of the job and result tables.
+
+        Returns:
+            dict: Row count per table, plus total bytes on disk when running on PostgreSQL.
+        """
+        sizes = {}
+        with self.engine.connect() as conn:
+            for name, table in TABLES.items():
+                sizes[name] = {'rows': conn.execute(select(func.count()).select_from(table.__table__)).scalar()}
+                if self.engine.dialect.name == 'postgresql':
+                    sizes[name]['bytes'] = conn.execute(
+                        text("SELECT pg_total_relation_size(:name)"), {'name': name}).scalar()
+        return sizes
+
+    def _write_report(self, report):
+        os.makedirs(self.reports_dir, exist_ok=True)
+        path = os.path.join(self.reports_dir, f"retention_{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S}.json")
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        return path
+
+    def start_background(self):
+        """
+        Run a retention pass every `interval_minutes` in a daemon thread.
+
+        Returns:
+            threading.Thread: The started thread, or None when retention is disabled.
+        """
+        if not self.enabled:
+            return None
+        thread = threading.Thread(target=self._run_forever, name='retention', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run()
+            except Exception as e:
+                print(f"retention pass failed: {str(e)}")
+            self._stop.wait(self.interval_minutes * 60)
+
+
+if __name__ == "__main__":
+    # Usage:
+    #   python -m scripts.retention run
+    #   python -m scripts.retention restore [table] [start] [end]
+    #   python -m scripts.retention sizes
+    manager = RetentionManager.from_config()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        print(json.dumps(manager.run(), indent=2))
+    elif command == 'restore':
+        tables = [sys.argv[2]] if len(sys.argv) > 2 else list(TABLES)
+        start = sys.argv[3] if len(sys.argv) > 3 else None
+        end = sys.argv[4] if len(sys.argv) > 4 else None
+        for table_name in tables:
+            print(f"{table_name}: restored {manager.restore(table_name, start, end)} rows")
+    elif command == 'sizes':
+        print(json.dumps(manager.table_sizes(), indent=2))
+    else:
+        raise SystemExit(f"Unknown command '{command}'")
@@ -2,12 +2,11 @@ import time
 import whisper
 import soundfile as sf
 import pandas as pd
-import librosa
-from io import BytesIO
 
 from datetime import datetime, timezone
 
 from auth.db import engine
+from scripts.audio_preprocessing import AudioPreprocessor
 
 class TranscriptionGenerator:
     """
@@ -22,10 +21,14 @@ class TranscriptionGenerator:
         read_audio_and_generate_transcription(self, audio_path): Reads an audio file and generates a transcription.
     """
 
-    def __init__(self, audio_contents):
+    def __init__(self, audio_contents=None, decoded=None):
         self.model = whisper.load_model('medium')
-        file_buffer = BytesIO(audio_contents)
-        self.data_buffer, self.samplerate = librosa.load(file_buffer)  
+        preprocessor = AudioPreprocessor.from_config(target_sr=whisper.audio.SAMPLE_RATE)
+        if decoded is not None:
+            self.audio = preprocessor.process_decoded(*decoded)
+        else:
+            self.audio = preprocessor.process(audio_contents)
+        self.data_buffer, self.samplerate = self.audio.data, self.audio.samplerate
     
     def generate_transcription(self):
         """
@@ -52,7 +55,7 @@ class TranscriptionGenerator:
         Returns:
             float: The duration of the audio file in seconds.
         """
-        duration = round((len(self.data_buffer) / self.samplerate)/60, 2)
+        duration = round(self.audio.original_duration/60, 2)
         return duration
 
     def transcribe(self, job_id, model_id, correlation_id):
@@ -74,6 +77,6 @@ class TranscriptionGenerator:
         audio_duration  = self.get_audio_duration()
         finish_time     = str(datetime.now(tz=timezone.utc))[:10] + 'T' + str(datetime.now(tz=timezone.utc))[11:19]
         duration        = round((int(time.time()) - startimestamp) / 60, 2)
-        df              = pd.DataFrame([[job_id, model_id, correlation_id, transcription, audio_duration, start_time, finish_time, duration, datetime.now(tz=timezone.utc)]], 
-                        columns=['job_id', 'model_id', 'correlation_id', 'transcription', 'audio_duration', 'start_time', 'finish_time', 'stt_duration', 'inserted_at'])
+        df              = pd.DataFrame([[job_id, model_id, correlation_id, transcription, audio_duration, self.audio.silence_removed, start_time, finish_time, duration, datetime.now(tz=timezone.utc)]], 
+                        columns=['job_id', 'model_id', 'correlation_id', 'transcription', 'audio_duration', 'silence_removed', 'start_time', 'finish_time', 'stt_duration', 'inserted_at'])
         df.to_sql("stt_result", engine, if_exists='append', index=False)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import sys
+import threading
 import librosa
 import torch
 import time
@@ -5,12 +7,14 @@ import pandas as pd
 import soundfile as sf
 import torch.nn as nn
 import torch.nn.functional as F
-import librosa
-from io import BytesIO
 
 from datetime import datetime, timezone
+from sqlalchemy import update, bindparam
 from transformers import AutoConfig, Wav2Vec2FeatureExtractor, HubertPreTrainedModel, HubertModel
 from auth.db import engine
+from models.models import SAResult
+from scripts.audio_preprocessing import AudioPreprocessor
+from scripts.feature_store import FeatureStore
 
 
 model_name  = "xmj2002/hubert-base-ch-speech-emotion-recognition"
@@ -22,6 +26,22 @@ config = AutoConfig.from_pretrained(
     pretrained_model_name_or_path=model_name,
 )
 
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+def get_feature_store():
+    """
+    Open the shared feature store once per process.
+
+    Returns:
+        FeatureStore: The store, or None when it is disabled in the config.
+    """
+    global _feature_store
+    with _feature_store_lock:
+        if _feature_store is None:
+            _feature_store = FeatureStore.from_config(dim=config.hidden_size, model_name=model_name) or False
+    return _feature_store or None
+
 
 
 class HubertForSpeechClassification(HubertPreTrainedModel):
@@ -42,6 +62,20 @@ class HubertForSpeechClassification(HubertPreTrainedModel):
         self.classifier = HubertClassificationHead(config)
         self.init_weights()
 
+    def embed(self, x):
+        """
+        Run the Hubert encoder and mean-pool its hidden states.
+
+        Args:
+            x (torch.Tensor): The input tensor.
+
+        Returns:
+            torch.Tensor: The pooled embedding, shaped (batch, hidden_size).
+        """
+        outputs = self.hubert(x)
+        hidden_states = outputs[0]
+        return torch.mean(hidden_states, dim=1)
+
     def forward(self, x):
         """
         Forward pass of the HubertForSpeechClassification model.
@@ -52,9 +86,7 @@ class HubertForSpeechClassification(HubertPreTrainedModel):
         Returns:
             torch.Tensor: The output tensor.
         """
-        outputs = self.hubert(x)
-        hidden_states = outputs[0]
-        x = torch.mean(hidden_states, dim=1)
+        x = self.embed(x)
         x = self.classifier(x)
         return x
 
@@ -94,17 +126,24 @@ class StressAnalysisGenerator:
     Class for generating stress analysis results from audio files.
     """
 
-    def __init__(self, audio_contents):
+    def __init__(self, audio_contents=None, decoded=None):
         self.processor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
         self.model = HubertForSpeechClassification.from_pretrained(
             model_name,
             config=config,
         )
-        file_buffer = BytesIO(audio_contents)
-        self.data_buffer, self.samplerate = librosa.load(file_buffer, sr=sample_rate)
+        preprocessor = AudioPreprocessor.from_config(target_sr=sample_rate)
+        if decoded is not None:
+            self.audio = preprocessor.process_decoded(*decoded)
+        else:
+            self.audio = preprocessor.process(audio_contents)
+        self.data_buffer, self.samplerate = self.audio.data, self.audio.samplerate
+        self.feature_store = get_feature_store()
+        self.audio_hash = FeatureStore.hash_audio(self.data_buffer, self.samplerate)
         
 
-    def id2class(self, id):
+    @staticmethod
+    def id2class(id):
         """
         Convert class ID to corresponding emotion class.
 
@@ -140,10 +179,16 @@ class StressAnalysisGenerator:
         Returns:
             str: Emotion class prediction.
         """
-        speech      = self.processor(self.data_buffer, padding="max_length", truncation=True, max_length=duration * self.samplerate, return_tensors="pt", sampling_rate=self.samplerate).input_values
+        embedding = self.feature_store.get(self.audio_hash) if self.feature_store is not None else None
 
         with torch.no_grad():
-            logit = self.model(speech)
+            if embedding is None:
+                speech      = self.processor(self.data_buffer, padding="longest", truncation=True, max_length=duration * self.samplerate, return_tensors="pt", sampling_rate=self.samplerate).input_values
+                # Round-trip through float16 like the store does, so a cache hit scores the same as a miss.
+                embedding   = self.model.embed(speech)[0].half().float().cpu().numpy()
+                if self.feature_store is not None:
+                    self.feature_store.put(self.audio_hash, embedding)
+            logit = self.model.classifier(torch.from_numpy(embedding).unsqueeze(0))
 
         score   = F.softmax(logit, dim=1).detach().cpu().numpy()[0]
         id      = torch.argmax(logit).cpu().numpy()
@@ -160,7 +205,7 @@ class StressAnalysisGenerator:
         Returns:
             float: Duration of the audio file in minutes.
         """
-        duration = round((len(self.data_buffer) / self.samplerate)/60, 2)
+        duration = round(self.audio.original_duration/60, 2)
         return duration
 
 
@@ -182,6 +227,59 @@ class StressAnalysisGenerator:
         audio_duration  = self.get_audio_duration()
         finish_time     = str(datetime.now(tz=timezone.utc))[:10] + 'T' + str(datetime.now(tz=timezone.utc))[11:19]
         duration        = round((int(time.time()) - startimestamp) / 60, 2)
-        df              = pd.DataFrame([[job_id, model_id, correlation_id, emotion_result, round(confidence_value, 2), audio_duration, start_time, finish_time, duration, datetime.now(tz=timezone.utc)]], 
-                        columns=['job_id', 'model_id', 'correlation_id', 'emotion_result', 'confidence_value', 'audio_duration', 'start_time', 'finish_time', 'sa_duration', 'inserted_at'])
-        df.to_sql("sa_result", engine, if_exists='append', index=False)
\ No newline at end of file
+        df              = pd.DataFrame([[job_id, model_id, correlation_id, emotion_result, round(confidence_value, 2), audio_duration, self.audio.silence_removed, self.audio_hash, start_time, finish_time, duration, datetime.now(tz=timezone.utc)]], 
+                        columns=['job_id', 'model_id', 'correlation_id', 'emotion_result', 'confidence_value', 'audio_duration', 'silence_removed', 'audio_hash', 'start_time', 'finish_time', 'sa_duration', 'inserted_at'])
+        df.to_sql("sa_result", engine, if_exists='append', index=False)
+
+
+def rescore_history(head_path=None, batch_size=256):
+    """
+    Re-run a classification head over every cached embedding and update sa_result.
+
+    The Hubert encoder is never run: the head consumes the pooled embeddings of the
+    feature store in batches, and every sa_result row with a matching audio_hash gets
+    the new emotion_result and confidence_value.
+
+    Args:
+        head_path (str, optional): State dict of a HubertClassificationHead. Defaults to
+            the head of the pretrained model.
+        batch_size (int): Number of embeddings scored per forward pass.
+
+    Returns:
+        int: Number of sa_result rows updated.
+    """
+    feature_store = get_feature_store()
+    if feature_store is None:
+        raise ValueError("Feature store is disabled, enable it in the feature_store config section")
+
+    if head_path:
+        head = HubertClassificationHead(config)
+        head.load_state_dict(torch.load(head_path, map_location='cpu'))
+    else:
+        head = HubertForSpeechClassification.from_pretrained(model_name, config=config).classifier
+    head.eval()
+
+    hashes, embeddings = feature_store.items()
+    statement = (update(SAResult.__table__)
+                 .where(SAResult.__table__.c.audio_hash == bindparam('b_audio_hash'))
+                 .values(emotion_result=bindparam('b_emotion_result'),
+                         confidence_value=bindparam('b_confidence_value')))
+    updated = 0
+    for start in range(0, len(hashes), batch_size):
+        batch = torch.from_numpy(embeddings[start:start + batch_size].astype('float32'))
+        with torch.no_grad():
+            scores = F.softmax(head(batch), dim=1)
+        confidences, ids = torch.max(scores, dim=1)
+        params = [{'b_audio_hash': audio_hash,
+                   'b_emotion_result': StressAnalysisGenerator.id2class(int(id)),
+                   'b_confidence_value': round(float(confidence), 2)}
+                  for audio_hash, id, confidence in zip(hashes[start:start + batch_size], ids, confidences)]
+        with engine.begin() as conn:
+            updated += conn.execute(statement, params).rowcount
+    return updated
+
+
+if __name__ == "__main__":
+    # Usage: python -m scripts.stress_analysis rescore [head_state_dict.pt]
+    if len(sys.argv) > 1 and sys.argv[1] == 'rescore':
+        print(f"updated {rescore_history(sys.argv[2] if len(sys.argv) > 2 else None)} sa_result rows")
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import torch
+import yaml
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from importlib import import_module
+
+from config import CONFIG_PATH, load_config_section
+
+
+def available_cores():
+    """
+    List the CPU cores this process may run on.
+
+    Returns:
+        list: Core ids, honouring container cpusets where the platform exposes them.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class WorkerPool:
+    """
+    Limits concurrent inference to `num_workers` slots, each owning its own CPU cores.
+
+    Without it every job runs torch with the default intra-op thread count, so a
+    few concurrent jobs oversubscribe the container. Every slot is a long-lived
+    single thread that, when `cpu_affinity` is on, pins itself to the slot's cores
+    once at start. Torch creates the intra-op thread team of a calling thread the
+    first time it runs parallel work and keeps it, so a slot's team stays on the
+    slot's cores for the life of the pool.
+
+    Methods:
+        from_config(): Builds a pool from the `workers` config section.
+        configure(): Applies the torch thread settings to the current process.
+        run(function, *args, **kwargs): Runs a call on a free slot and returns its result.
+        close(): Stops the slot threads.
+    """
+
+    def __init__(self, num_workers=1, num_threads=0, num_interop_threads=1, cpu_affinity=True):
+        cores = available_cores()
+        self.num_workers = max(1, min(num_workers, len(cores)))
+        self.num_threads = num_threads or max(1, len(cores) // self.num_workers)
+        self.num_interop_threads = num_interop_threads
+        self.cpu_affinity = cpu_affinity and hasattr(os, 'sched_setaffinity')
+        self.partitions = [
+            set(cores[index * self.num_threads:(index + 1) * self.num_threads]) or set(cores)
+            for index in range(self.num_workers)
+        ]
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'inference-{index}',
+                               initializer=self._start_slot, initargs=(index,))
+            for index in range(self.num_workers)
+        ]
+        self._slots = queue.Queue()
+        for index in range(self.num_workers):
+            self._slots.put(index)
+
+    @classmethod
+    def from_config(cls, config_path=CONFIG_PATH):
+        """
+        Build a pool from the `workers` section of the model config.
+
+        Args:
+            config_path (str): Path to the yaml config file.
+
+        Returns:
+            WorkerPool: The configured pool.
+        """
+        return cls(**load_config_section('workers', config_path))
+
+    def configure(self):
+        """
+        Apply the torch thread settings to the current process.
+
+        The inter-op thread count can only be set before torch runs any parallel
+        work, so a failure to change it afterwards is ignored.
+        """
+        torch.set_num_threads(self.num_threads)
+        try:
+            torch.set_num_interop_threads(self.num_interop_threads)
+        except RuntimeError:
+            pass
+
+    def _start_slot(self, index):
+        if self.cpu_affinity:
+            # On Linux pid 0 means the calling thread, i.e. only this slot's thread.
+            os.sched_setaffinity(0, self.partitions[index])
+        torch.set_num_threads(self.num_threads)
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run `function` on the thread of a free slot, blocking until one is available.
+
+        Args:
+            function (callable): The call to run.
+            *args: Positional arguments of the call.
+            **kwargs: Keyword arguments of the call.
+
+        Returns:
+            The return value of `function`; its exceptions are re-raised.
+        """
+        index = self._slots.get()
+        try:
+            return self._executors[index].submit(function, *args, **kwargs).result()
+        finally:
+            self._slots.put(index)
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+
+def benchmark_layout(model_config, audio_contents, num_workers, num_threads, runs,
+                     num_interop_threads=1, cpu_affinity=True):
+    """
+    Measure inference throughput of a `WorkerPool` with the given layout.
+
+    The layout is measured the way the API runs it: one process, `num_workers`
+    concurrent jobs submitted to the pool's slots. Every job loads its own model
+    instance, like a request does, but loading is not timed.
+
+    Args:
+        model_config (dict): Config of the model to benchmark.
+        audio_contents (bytes): Audio used for every inference.
+        num_workers (int): Number of pool slots and concurrent jobs.
+        num_threads (int): Torch intra-op threads per slot.
+        runs (int): Timed inferences per job, after one warm-up inference.
+        num_interop_threads (int): Inter-op threads of the process, recorded in the result.
+        cpu_affinity (bool): Whether slots are pinned to their cores.
+
+    Returns:
+        dict: The layout with its wall time and throughput.
+    """
+    pool = WorkerPool(num_workers=num_workers, num_threads=num_threads,
+                      num_interop_threads=num_interop_threads, cpu_affinity=cpu_affinity)
+    barrier = threading.Barrier(num_workers)
+    class_name, function_name = model_config['benchmark'].rsplit('.', 1)
+    model_class = getattr(import_module(f"scripts.{model_config['module']}"), class_name)
+
+    def job():
+        try:
+            instance = pool.run(model_class, audio_contents=audio_contents)
+            if hasattr(instance, 'feature_store'):
+                # Cached embeddings would skip the encoder after the first run.
+                instance.feature_store = None
+            function = getattr(instance, function_name)
+            pool.run(function)
+            barrier.wait()
+        except Exception:
+            # Release the other jobs instead of leaving them at the barrier.
+            barrier.abort()
+            raise
+        start = time.perf_counter()
+        for _ in range(runs):
+            pool.run(function)
+        return start, time.perf_counter(), instance.audio.original_duration
+
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(job) for _ in range(num_workers)]
+            timings = [future.result() for future in futures]
+    finally:
+        pool.close()
+
+    wall_time = max(finish for _, finish, _ in timings) - min(start for start, _, _ in timings)
+    inferences = num_workers * runs
+    audio_seconds = sum(seconds for _, _, seconds in timings) * runs
+    return {
+        'num_workers': num_workers,
+        'num_threads': num_threads,
+        'num_interop_threads': num_interop_threads,
+        'cpu_affinity': pool.cpu_affinity,
+        'inferences': inferences,
+        'wall_time': round(wall_time, 3),
+        'inferences_per_minute': round(inferences / wall_time * 60, 2),
+        'audio_seconds_per_second': round(audio_seconds / wall_time, 2),
+    }
+
+
+def candidate_layouts(num_cores):
+    """
+    List the worker x thread layouts that fit on `num_cores` cores without oversubscription.
+
+    Args:
+        num_cores (int): Number of available cores.
+
+    Returns:
+        list: (num_workers, num_threads) pairs.
+    """
+    counts = sorted({2 ** power for power in range(num_cores.bit_length()) if 2 ** power <= num_cores} | {num_cores})
+    layouts = []
+    for num_workers in counts:
+        threads = sorted({count for count in counts if count * num_workers <= num_cores} | {num_cores // num_workers})
+        layouts += [(num_workers, num_threads) for num_threads in threads]
+    return layouts
+
+
+def run_benchmark(model_name, audio_path, runs=3, write_config=True, config_path=CONFIG_PATH, reports_dir='reports'):
+    """
+    Sweep worker x thread layouts on this host and keep the fastest one.
+
+    Layouts run through `WorkerPool` in this process with the configured
+    `num_interop_threads` and `cpu_affinity`, as the API runs them. Every layout
+    is written to a report in `reports_dir`; the layout with the highest
+    throughput is written to the `workers` section of the config.
+
+    Args:
+        model_name (str): Name of the configured model to benchmark.
+        audio_path (str): Audio file used for every inference.
+        runs (int): Timed inferences per worker.
+        write_config (bool): Whether to store the best layout in the config file.
+        config_path (str): Path to the yaml config file.
+        reports_dir (str): Directory of the benchmark report.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    with open(config_path, 'r') as file:
+        config = yaml.safe_load(file)
+    model_config = next((model for model in config['models'] if model['name'] == model_name), None)
+    if model_config is None:
+        raise ValueError(f"No model named {model_name} in {config_path}")
+    with open(audio_path, 'rb') as file:
+        audio_contents = file.read()
+
+    # Inter-op threads are fixed once per process, so every layout uses the configured value.
+    workers_config = config.get('workers') or {}
+    num_interop_threads = workers_config.get('num_interop_threads', 1)
+    cpu_affinity = workers_config.get('cpu_affinity', True)
+    torch.set_num_interop_threads(num_interop_threads)
+
+    cores = available_cores()
+    results = []
+    for num_workers, num_threads in candidate_layouts(len(cores)):
+        result = benchmark_layout(model_config, audio_contents, num_workers, num_threads, runs,
+                                  num_interop_threads=num_interop_threads, cpu_affinity=cpu_affinity)
+        print(json.dumps(result))
+        results.append(result)
+    best = max(results, key=lambda result: result['inferences_per_minute'])
+
+    report = {
+        'created_at': datetime.now(tz=timezone.utc).isoformat(),
+        'model_name': model_name,
+        'audio_path': audio_path,
+        'cores': len(cores),
+        'runs': runs,
+        'results': results,
+        'best': best,
+    }
+    os.makedirs(reports_dir, exist_ok=True)
+    path = os.path.join(reports_dir, f"worker_benchmark_{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    if write_config:
+        workers = config.setdefault('workers', {})
+        workers['num_workers'] = best['num_workers']
+        workers['num_threads'] = best['num_threads']
+        with open(config_path, 'w') as file:
+            yaml.safe_dump(config, file, sort_keys=False, default_flow_style=None)
+    return report
+
+
+if __name__ == "__main__":
+    # Usage: python -m scripts.workers --model stress_analysis --audio data/audio/02_30-0.wav
+    parser = argparse.ArgumentParser(description="Find the fastest worker x thread layout for this host.")
+    parser.add_argument('--model', default='stress_analysis')
+    parser.add_argument('--audio', default='data/audio/02_30-0.wav')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--dry-run', action='store_true', help="only write the report, keep the config as is")
+    args = parser.parse_args()
+    report = run_benchmark(args.model, args.audio, runs=args.runs, write_config=not args.dry_run)
+    print(f"best layout: {report['best']['num_workers']} workers x {report['best']['num_threads']} threads")
@@ -2,8 +2,9 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from API.main import app, get_db
-from models.models import Base, Users
+import API.main
+from API.main import app, get_db, build_pipeline_stages, process_pipeline
+from models.models import Base, Users, Job
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
@@ -127,4 +128,133 @@ def test_get_results(access_token):
         headers={"Authorization": f"Bearer {access_token}"},
         params={"correlation_id": "test_correlation_id"}
     )
-    assert response.status_code in [200, 404]
\ No newline at end of file
+    assert response.status_code in [200, 404]
+
+def test_create_pipeline_unknown_model(access_token):
+    data = {
+        "explaining": "true",
+        "correlation_id": "test_pipeline_correlation_id",
+        "model_names": "speech_to_text,unknown_model"
+    }
+    files = {
+        "data": ("../data/audio/02_30-0.wav", b"some file content", "audio/wav")
+    }
+    response = client.post(
+        "/models/pipeline",
+        headers={"Authorization": f"Bearer {access_token}"},
+        data=data,
+        files=files
+    )
+    assert response.status_code == 400
+
+def test_create_pipeline_unregistered_model(access_token):
+    data = {
+        "explaining": "true",
+        "correlation_id": "test_pipeline_correlation_id",
+        "model_names": '["speech_to_text", "stress_analysis"]'
+    }
+    files = {
+        "data": ("../data/audio/02_30-0.wav", b"some file content", "audio/wav")
+    }
+    response = client.post(
+        "/models/pipeline",
+        headers={"Authorization": f"Bearer {access_token}"},
+        data=data,
+        files=files
+    )
+    assert response.status_code == 404
+
+def test_create_pipeline(access_token):
+    for model_name in ["speech_to_text", "stress_analysis"]:
+        client.post(
+            "/models/regis_model",
+            headers={"Authorization": f"Bearer {access_token}"},
+            json={"ml_model_name": model_name}
+        )
+    data = {
+        "explaining": "true",
+        "correlation_id": "test_pipeline_correlation_id",
+        "model_names": "speech_to_text,stress_analysis"
+    }
+    files = {
+        "data": ("../data/audio/02_30-0.wav", b"some file content", "audio/wav")
+    }
+    response = client.post(
+        "/models/pipeline",
+        headers={"Authorization": f"Bearer {access_token}"},
+        data=data,
+        files=files
+    )
+    assert response.status_code == 201
+    assert "job_id" in response.json()
+    assert [child["ml_model_name"] for child in response.json()["children"]] == ["speech_to_text", "stress_analysis"]
+
+    response = client.get(
+        f"/models/pipeline/{response.json()['job_id']}",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json()["progress"]["complete"] is True
+    assert len(response.json()["children"]) == 2
+
+def test_get_pipeline_not_found(access_token):
+    response = client.get(
+        "/models/pipeline/999999",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 404
+
+def test_build_pipeline_stages_orders_dependencies():
+    model_configs = [
+        {"name": "a"},
+        {"name": "b", "depends_on": ["a"]},
+        {"name": "c"},
+        {"name": "d", "depends_on": ["b", "c"]},
+    ]
+    assert build_pipeline_stages(model_configs) == [["a", "c"], ["b"], ["d"]]
+
+def test_build_pipeline_stages_missing_dependency():
+    with pytest.raises(ValueError, match="not in the pipeline"):
+        build_pipeline_stages([{"name": "b", "depends_on": ["a"]}])
+
+def test_build_pipeline_stages_cycle():
+    with pytest.raises(ValueError, match="cycle"):
+        build_pipeline_stages([
+            {"name": "a"},
+            {"name": "b", "depends_on": ["c"]},
+            {"name": "c", "depends_on": ["b"]},
+        ])
+
+def test_process_pipeline_skips_children_of_failed_model(monkeypatch):
+    model_configs = [{"name": "a"}, {"name": "b", "depends_on": ["a"]}, {"name": "c"}]
+    db = TestingSessionLocal()
+    parent = Job(transaction="pipeline", correlation_id="test_skip", complete=False, message="on progress")
+    db.add(parent)
+    db.commit()
+    children = {}
+    for model_config in model_configs:
+        job = Job(parent_id=parent.id, transaction="reply", correlation_id="test_skip", complete=False, message="on progress")
+        db.add(job)
+        db.commit()
+        children[model_config["name"]] = (model_config, job.id, None)
+
+    calls = []
+    def run_pipeline_model(model_config, job_id, model_id, correlation_id, **params):
+        calls.append(model_config["name"])
+        assert params["decoded"] == ("waveform", 16000)
+        if model_config["name"] == "a":
+            raise ValueError("model a broke")
+
+    monkeypatch.setattr(API.main, "run_pipeline_model", run_pipeline_model)
+    monkeypatch.setattr(API.main.AudioPreprocessor, "decode", staticmethod(lambda contents: ("waveform", 16000)))
+    process_pipeline(db, parent.id, build_pipeline_stages(model_configs), children, "test_skip", b"audio")
+
+    messages = {name: db.query(Job).filter(Job.id == job_id).first().message for name, (_, job_id, _) in children.items()}
+    assert sorted(calls) == ["a", "c"]
+    assert messages == {
+        "a": "failed: model a broke",
+        "b": "failed: skipped because a failed",
+        "c": "successful",
+    }
+    assert db.query(Job).filter(Job.id == parent.id).first().message == "failed: a, b"
+    db.close()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from scripts.audio_preprocessing import AudioPreprocessor
+
+SAMPLE_RATE = 16000
+
+def tone(seconds, amplitude=0.5, frequency=440):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+def make_preprocessor(**params):
+    return AudioPreprocessor(target_sr=SAMPLE_RATE, **params)
+
+def test_trim_removes_long_silence():
+    preprocessor = make_preprocessor(min_silence_duration=0.5, keep_silence=0.1)
+    data = np.concatenate([tone(1), silence(2), tone(1)])
+    trimmed, removed = preprocessor.trim(data)
+    assert removed / SAMPLE_RATE == pytest.approx(1.8, abs=0.05)
+    assert len(trimmed) == len(data) - removed
+
+def test_trim_keeps_short_pauses():
+    preprocessor = make_preprocessor(min_silence_duration=0.5, keep_silence=0.1)
+    data = np.concatenate([tone(1), silence(0.3), tone(1)])
+    trimmed, removed = preprocessor.trim(data)
+    assert removed == 0
+    assert np.array_equal(trimmed, data)
+
+def test_trim_keep_silence_pads_voiced_regions():
+    data = np.concatenate([tone(1), silence(2), tone(1)])
+    _, removed_without_padding = make_preprocessor(keep_silence=0.0).trim(data)
+    _, removed_with_padding = make_preprocessor(keep_silence=0.2).trim(data)
+    kept = (removed_without_padding - removed_with_padding) / SAMPLE_RATE
+    assert kept == pytest.approx(0.4, abs=0.03)
+
+def test_trim_leading_and_trailing_silence():
+    preprocessor = make_preprocessor(min_silence_duration=0.5, keep_silence=0.1)
+    data = np.concatenate([silence(1), tone(1), silence(1)])
+    trimmed, removed = preprocessor.trim(data)
+    assert removed / SAMPLE_RATE == pytest.approx(1.8, abs=0.05)
+    assert np.max(np.abs(trimmed)) == pytest.approx(0.5, abs=0.01)
+
+def test_normalize_loudness_reaches_target():
+    preprocessor = make_preprocessor(target_dbfs=-20.0)
+    normalized = preprocessor.normalize_loudness(tone(1, amplitude=0.01))
+    assert np.sqrt(np.mean(np.square(normalized))) == pytest.approx(0.1, rel=0.01)
+
+def test_normalize_loudness_does_not_clip():
+    preprocessor = make_preprocessor(target_dbfs=0.0)
+    normalized = preprocessor.normalize_loudness(tone(1, amplitude=0.1))
+    assert np.max(np.abs(normalized)) == pytest.approx(0.99, abs=1e-6)
+
+def test_normalize_loudness_leaves_silence():
+    preprocessor = make_preprocessor()
+    assert np.array_equal(preprocessor.normalize_loudness(silence(1)), silence(1))
+
+def test_process_decoded_downmixes_and_reports_removed_seconds():
+    preprocessor = make_preprocessor(min_silence_duration=0.5, keep_silence=0.1)
+    mono = np.concatenate([tone(1), silence(2), tone(1)])
+    audio = preprocessor.process_decoded(np.stack([mono, mono]), SAMPLE_RATE)
+    assert audio.samplerate == SAMPLE_RATE
+    assert audio.data.dtype == np.float32
+    assert audio.original_duration == pytest.approx(4.0)
+    assert audio.silence_removed == pytest.approx(1.8, abs=0.05)
+    assert len(audio.data) / SAMPLE_RATE == pytest.approx(4.0 - audio.silence_removed, abs=0.01)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scripts.feature_store import FeatureStore
+
+DIM = 8
+MODEL_NAME = "test-encoder"
+
+def embedding(seed):
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+def test_put_get_round_trip(tmp_path):
+    store = FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME)
+    store.put("a", embedding(0))
+    cached = store.get("a")
+    assert cached.dtype == np.float32
+    assert np.array_equal(cached, embedding(0).astype(np.float16).astype(np.float32))
+    assert store.get("missing") is None
+
+def test_put_overwrites_existing_hash(tmp_path):
+    store = FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME)
+    store.put("a", embedding(0))
+    store.put("a", embedding(1))
+    assert len(store) == 1
+    assert np.allclose(store.get("a"), embedding(1), atol=1e-2)
+
+def test_grows_past_initial_capacity(tmp_path):
+    store = FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME, initial_capacity=2)
+    for seed in range(5):
+        store.put(f"hash-{seed}", embedding(seed))
+    assert store.capacity == 8
+    hashes, embeddings = store.items()
+    assert hashes == [f"hash-{seed}" for seed in range(5)]
+    assert embeddings.shape == (5, DIM)
+    for seed in range(5):
+        assert np.allclose(store.get(f"hash-{seed}"), embedding(seed), atol=1e-2)
+
+def test_reopen_existing_store(tmp_path):
+    store = FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME, initial_capacity=2)
+    for seed in range(3):
+        store.put(f"hash-{seed}", embedding(seed))
+    del store
+
+    reopened = FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME)
+    assert len(reopened) == 3
+    assert reopened.capacity == 4
+    assert np.allclose(reopened.get("hash-2"), embedding(2), atol=1e-2)
+    reopened.put("hash-3", embedding(3))
+    assert reopened.items()[0] == [f"hash-{seed}" for seed in range(4)]
+
+@pytest.mark.parametrize("dim, model_name", [(DIM + 1, MODEL_NAME), (DIM, "other-encoder")])
+def test_reopen_with_other_encoder_fails(tmp_path, dim, model_name):
+    FeatureStore(str(tmp_path), dim=DIM, model_name=MODEL_NAME)
+    with pytest.raises(ValueError, match="Feature store"):
+        FeatureStore(str(tmp_path), dim=dim, model_name=model_name)
+
+def test_hash_audio_depends_on_samples_and_rate():
+    data = np.linspace(-1, 1, 100, dtype=np.float32)
+    assert FeatureStore.hash_audio(data, 16000) == FeatureStore.hash_audio(data.copy(), 16000)
+    assert FeatureStore.hash_audio(data, 16000) != FeatureStore.hash_audio(data, 8000)
+    assert FeatureStore.hash_audio(data, 16000) != FeatureStore.hash_audio(data[::-1], 16000)
@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, inspect, text
+from models.models import upgrade_schema
+
+def create_old_schema(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE ml_models (id INTEGER PRIMARY KEY, ml_model_name VARCHAR(100) UNIQUE)"))
+        conn.execute(text(
+            "CREATE TABLE ml_models_inference (id INTEGER PRIMARY KEY, model_id INTEGER REFERENCES ml_models (id), "
+            "file_name VARCHAR, correlation_id VARCHAR, \"transaction\" VARCHAR, complete BOOLEAN, "
+            "message VARCHAR, updated_at DATETIME)"))
+        conn.execute(text(
+            "CREATE TABLE sa_result (job_id INTEGER, model_id INTEGER, correlation_id VARCHAR, "
+            "emotion_result VARCHAR, confidence_value FLOAT, audio_duration FLOAT, start_time DATETIME, "
+            "finish_time DATETIME, sa_duration INTEGER, inserted_at DATETIME, PRIMARY KEY (job_id, model_id))"))
+        conn.execute(text("INSERT INTO ml_models_inference (id, file_name) VALUES (1, 'old.wav')"))
+
+def test_upgrade_schema_adds_missing_columns_and_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    create_old_schema(engine)
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    job_columns = {column['name'] for column in inspector.get_columns('ml_models_inference')}
+    sa_columns = {column['name'] for column in inspector.get_columns('sa_result')}
+    assert 'parent_id' in job_columns
+    assert {'silence_removed', 'audio_hash'} <= sa_columns
+    job_indexes = {index['name'] for index in inspector.get_indexes('ml_models_inference')}
+    assert {'ix_ml_models_inference_updated_at', 'ix_ml_models_inference_parent_id'} <= job_indexes
+    assert 'ix_sa_result_inserted_at' in {index['name'] for index in inspector.get_indexes('sa_result')}
+    assert not inspector.has_table('stt_result')
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT file_name, parent_id FROM ml_models_inference")).all() == [('old.wav', None)]
@@ -0,0 +1,118 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models.models import Base, MLModel, Job, STTResult
+from scripts.retention import RetentionManager
+
+MODELS = [{"name": "speech_to_text", "table_model": "STTResult", "ttl_days": 30}]
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def make_manager(engine, tmp_path, **params):
+    return RetentionManager(models=MODELS, archive_dir=str(tmp_path / "archive"),
+                            reports_dir=str(tmp_path / "reports"), engine=engine, **params)
+
+def add_jobs(engine, ages_in_days):
+    now = datetime.utcnow()
+    db = sessionmaker(bind=engine)()
+    model = MLModel(ml_model_name="speech_to_text")
+    db.add(model)
+    db.commit()
+    for age in ages_in_days:
+        timestamp = now - timedelta(days=age)
+        job = Job(model_id=model.id, correlation_id=f"age-{age}", transaction="reply",
+                  complete=True, message="successful", updated_at=timestamp)
+        db.add(job)
+        db.commit()
+        db.add(STTResult(job_id=job.id, model_id=model.id, correlation_id=job.correlation_id,
+                         transcription="{halo}", audio_duration=0.5, inserted_at=timestamp))
+        db.commit()
+    db.close()
+
+def count(engine, table):
+    db = sessionmaker(bind=engine)()
+    rows = db.query(table).count()
+    db.close()
+    return rows
+
+def test_run_purges_expired_rows_in_batches(engine, tmp_path):
+    add_jobs(engine, [40, 45, 50, 60, 70, 5, 10])
+    manager = make_manager(engine, tmp_path, batch_size=2)
+
+    report = manager.run()
+
+    assert count(engine, STTResult) == 2
+    assert count(engine, Job) == 2
+    assert report["tables"]["stt_result"]["rows"] == 5
+    assert report["tables"]["ml_models_inference"]["rows"] == 5
+    assert report["table_sizes"]["stt_result"]["rows"] == 2
+    assert len(os.listdir(tmp_path / "reports")) == 1
+
+def test_run_delete_mode_writes_no_archive(engine, tmp_path):
+    add_jobs(engine, [40, 5])
+    make_manager(engine, tmp_path, mode="delete").run()
+    assert count(engine, Job) == 1
+    assert not os.path.exists(tmp_path / "archive")
+
+@pytest.mark.parametrize("partition_by, partition_format", [("day", "%Y-%m-%d"), ("month", "%Y-%m")])
+def test_archive_partition_layout(engine, tmp_path, partition_by, partition_format):
+    add_jobs(engine, [40, 45])
+    make_manager(engine, tmp_path, partition_by=partition_by).run()
+
+    now = datetime.utcnow()
+    expected = {f"dt={(now - timedelta(days=age)).strftime(partition_format)}" for age in [40, 45]}
+    for table_name in ["ml_models_inference", "stt_result"]:
+        table_dir = tmp_path / "archive" / table_name
+        assert set(os.listdir(table_dir)) == expected
+        for partition in expected:
+            assert all(name.startswith("part-") and name.endswith(".jsonl.gz")
+                       for name in os.listdir(table_dir / partition))
+
+def test_restore_is_idempotent(engine, tmp_path):
+    add_jobs(engine, [40, 45, 5])
+    manager = make_manager(engine, tmp_path)
+    manager.run()
+    assert count(engine, STTResult) == 1
+
+    assert manager.restore("ml_models_inference") == 2
+    assert manager.restore("stt_result") == 2
+    assert manager.restore("ml_models_inference") == 0
+    assert manager.restore("stt_result") == 0
+
+    db = sessionmaker(bind=engine)()
+    results = db.query(STTResult).all()
+    assert len(results) == 3
+    assert {result.transcription for result in results} == {"{halo}"}
+    db.close()
+
+def test_restore_inserts_pipeline_parents_first(engine, tmp_path):
+    old = datetime.utcnow() - timedelta(days=100)
+    db = sessionmaker(bind=engine)()
+    model = MLModel(ml_model_name="speech_to_text")
+    db.add(model)
+    db.commit()
+    parent = Job(transaction="pipeline", complete=True, message="successful", updated_at=old + timedelta(days=1))
+    db.add(parent)
+    db.commit()
+    db.add(Job(model_id=model.id, parent_id=parent.id, transaction="reply", complete=True,
+               message="successful", updated_at=old))
+    db.commit()
+    db.close()
+
+    manager = make_manager(engine, tmp_path)
+    manager.run()
+    assert count(engine, Job) == 0
+
+    assert manager.restore("ml_models_inference") == 2
+    assert count(engine, Job) == 2
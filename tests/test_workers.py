@@ -0,0 +1,64 @@
+import os
+import threading
+import pytest
+import scripts.workers as workers
+from scripts.workers import WorkerPool, candidate_layouts
+
+def test_candidate_layouts_single_core():
+    assert candidate_layouts(1) == [(1, 1)]
+
+def test_candidate_layouts_four_cores():
+    assert candidate_layouts(4) == [(1, 1), (1, 2), (1, 4), (2, 1), (2, 2), (4, 1)]
+
+@pytest.mark.parametrize("num_cores", [1, 2, 3, 6, 8, 12])
+def test_candidate_layouts_never_oversubscribe(num_cores):
+    layouts = candidate_layouts(num_cores)
+    assert (1, num_cores) in layouts
+    assert all(num_workers * num_threads <= num_cores for num_workers, num_threads in layouts)
+    assert len(layouts) == len(set(layouts))
+
+@pytest.fixture
+def eight_cores(monkeypatch):
+    monkeypatch.setattr(workers, "available_cores", lambda: list(range(8)))
+
+@pytest.mark.parametrize("num_workers, num_threads, partitions", [
+    (1, 0, [set(range(8))]),
+    (2, 0, [{0, 1, 2, 3}, {4, 5, 6, 7}]),
+    (3, 0, [{0, 1}, {2, 3}, {4, 5}]),
+    (2, 3, [{0, 1, 2}, {3, 4, 5}]),
+    (16, 0, [{core} for core in range(8)]),
+])
+def test_worker_pool_partitions(eight_cores, num_workers, num_threads, partitions):
+    pool = WorkerPool(num_workers=num_workers, num_threads=num_threads, cpu_affinity=False)
+    assert pool.partitions == partitions
+    assert pool.num_workers == len(partitions)
+    pool.close()
+
+def test_worker_pool_oversized_threads_fall_back_to_all_cores(eight_cores):
+    pool = WorkerPool(num_workers=2, num_threads=6, cpu_affinity=False)
+    assert pool.partitions == [set(range(6)), {6, 7}]
+    pool.close()
+    pool = WorkerPool(num_workers=2, num_threads=8, cpu_affinity=False)
+    assert pool.partitions == [set(range(8)), set(range(8))]
+    pool.close()
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="CPU affinity is Linux only")
+def test_worker_pool_runs_on_a_pinned_long_lived_thread():
+    caller_affinity = os.sched_getaffinity(0)
+    pool = WorkerPool(num_workers=1, num_threads=1)
+    first = pool.run(lambda: (threading.get_ident(), os.sched_getaffinity(0)))
+    second = pool.run(lambda: (threading.get_ident(), os.sched_getaffinity(0)))
+    pool.close()
+
+    assert first == second
+    assert first[0] != threading.get_ident()
+    assert first[1] == pool.partitions[0]
+    assert os.sched_getaffinity(0) == caller_affinity
+
+def test_worker_pool_run_returns_and_raises():
+    pool = WorkerPool(num_workers=1, cpu_affinity=False)
+    assert pool.run(lambda value, offset=0: value + offset, 1, offset=2) == 3
+    with pytest.raises(ValueError, match="broken"):
+        pool.run(lambda: (_ for _ in ()).throw(ValueError("broken")))
+    assert pool.run(lambda: "slot released") == "slot released"
+    pool.close()